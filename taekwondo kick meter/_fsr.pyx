@@ -0,0 +1,67 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled FSR conversion kernel for the Taekwondo kick meter.
+Drop-in replacement for fsr_percentage() and max_fsr_percentage() in pi.py,
+working directly on int16 ADC readings without Python float objects.
+
+Build in place with: python3 setup.py build_ext --inplace
+"""
+
+# Calibration range and precomputed percent-per-count scale (set by configure_fsr)
+cdef short _fsr_min = 0
+cdef short _fsr_max = 0
+cdef float _fsr_scale = 0.0
+
+
+def configure_fsr(short f_min, short f_max, float scale):
+    """
+    Set the FSR calibration range used by the conversion functions.
+    
+    Args:
+        f_min (int): Minimum calibration value (no pressure)
+        f_max (int): Maximum calibration value (full pressure)
+        scale (float): Percentage per raw count, 100 / (f_max - f_min)
+    """
+    global _fsr_min, _fsr_max, _fsr_scale
+    _fsr_min = f_min
+    _fsr_max = f_max
+    _fsr_scale = scale
+
+
+cpdef inline float fsr_percentage(short raw) nogil:
+    """
+    Convert raw ADC reading to percentage value (0-100%).
+    
+    Args:
+        raw (int): Raw ADC reading from FSR sensor
+    
+    Returns:
+        float: Percentage value between 0-100%
+    """
+    # Clamp raw value within calibration range
+    if raw < _fsr_min:
+        raw = _fsr_min
+    elif raw > _fsr_max:
+        raw = _fsr_max
+    return (raw - _fsr_min) * _fsr_scale
+
+
+cpdef float max_fsr_percentage(const short[::1] raw_values):
+    """
+    Convert a set of raw FSR readings and return the highest percentage.
+    
+    Args:
+        raw_values (np.ndarray): Raw int16 ADC readings, one per FSR channel
+    
+    Returns:
+        float: Maximum percentage value between 0-100%
+    """
+    cdef float highest = 0.0
+    cdef float percent
+    cdef Py_ssize_t i
+    with nogil:
+        for i in range(raw_values.shape[0]):
+            percent = fsr_percentage(raw_values[i])
+            if percent > highest:
+                highest = percent
+    return highest
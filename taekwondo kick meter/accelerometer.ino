@@ -1,6 +1,5 @@
 #include <Arduino_LSM6DS3.h>   // IMU sensor (LSM6DS3) library
 #include <ArduinoBLE.h>        // BLE communication library
-#include <ArduinoJson.h>       // JSON serialization library
 
 const float G = 9.81f;                        // Gravity constant (m/s²)
 const float KICK_THRESHOLD_G = 3.0f;          // Minimum G-force to register as kick
@@ -19,21 +18,16 @@ bool isStabilized = false;                             // Flag for stabilization
 
 BLEService kickService("19b10000-e8f2-537e-4f6c-d104768a1200");  // Kick Meter Service UUID
 BLECharacteristic kickChar("19b10001-e8f2-537e-4f6c-d104768a1200",
-                           BLERead | BLENotify, 64);             // JSON payload characteristic
+                           BLERead | BLENotify, 8, true);        // Binary payload characteristic
 
 void sendKickBLE(float peakAccel, float kickSpeed) {
-  StaticJsonDocument<128> doc;
-
-  // Prepare JSON payload
-  doc["accel"] = peakAccel * G;  // Convert from G to m/s²
-  doc["speed"] = kickSpeed;      // Speed of kick in m/s
-
-  char buffer[64];
-  serializeJson(doc, buffer);
-
-  // Send JSON string to BLE characteristic
-  kickChar.writeValue(buffer);
+  // Prepare binary payload (little-endian float32 values)
+  float payload[2];
+  payload[0] = kickSpeed;      // Speed of kick in m/s
+  payload[1] = peakAccel * G;  // Convert from G to m/s²
 
+  // Send raw bytes to BLE characteristic
+  kickChar.writeValue((const uint8_t*)payload, sizeof(payload));
 }
 
 void setup() {
@@ -79,8 +73,8 @@ void setup() {
   kickService.addCharacteristic(kickChar); // Add data characteristic
   BLE.addService(kickService);
 
-  // Initial status message
-  kickChar.writeValue("Ready");
+  // Initial value: no kick yet
+  sendKickBLE(0.0f, 0.0f);
 
   // Begin BLE advertising
   BLE.advertise();
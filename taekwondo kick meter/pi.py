@@ -5,34 +5,44 @@ Main module for real-time kick detection using HX711 load cell, FSR sensors, and
 
 import asyncio
 from bleak import BleakClient, BleakScanner
-import json
-import requests
-from datetime import datetime, timezone
+import orjson
+import struct
+import aiohttp
 import time
+import threading
+from collections import deque
 import RPi.GPIO as GPIO
 from hx711 import HX711
 import os
+import numpy as np
 
 try:
-    import Adafruit_ADS1x15
+    import ADS1x15
 except ImportError:
-    print("Error: Adafruit_ADS1x15 library not found.")
-    print("Please install it using: sudo pip3 install adafruit-circuitpython-ads1x15")
+    print("Error: ADS1x15 library not found.")
+    print("Please install it using: sudo pip3 install ADS1x15-ADC")
     exit()
 
 # ==================== CONFIGURATION CONSTANTS ====================
 
 # Firebase Realtime Database URL for storing kick data
 FIREBASE_URL = "https://taekwondo-kick-meter-default-rtdb.asia-southeast1.firebasedatabase.app/kick_data.json"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"  # ISO 8601 date/time format for kick timestamps (fraction appended)
+UPLOAD_BATCH_SIZE = 8  # Maximum number of kicks sent in one Firebase write
+UPLOAD_BATCH_WINDOW = 2.0  # Seconds to collect further kicks before sending a batch
 
 # BLE Device Configuration
 DEVICE_NAME = "KickMeter"  # Name of the BLE device to connect to
 CHAR_UUID = "19b10001-e8f2-537e-4f6c-d104768a1200"  # Characteristic UUID for speed data
+SPEED_PACKET = struct.Struct("<ff")  # BLE payload: kick speed (m/s) and peak acceleration (m/s²) as little-endian float32
+SPEED_WAIT_TIMEOUT = 0.25  # Seconds to wait after a kick for its speed notification
+SPEED_MAX_LEAD = 0.5  # Speed notifications received this long before a kick belong to an earlier movement
 
 # Load Cell Configuration
 CALIB_FILE = "hx711_calibration.json"  # File to store calibration data
 KICK_THRESHOLD_KG = 4.0  # Minimum force in kg to register as a valid kick
 KICK_COOLDOWN = 1.0  # Minimum seconds between kick detections (prevents multiple triggers)
+FAST_GATE_KG = KICK_THRESHOLD_KG * 0.8  # Readings below this skip impact detection entirely
 
 # GPIO Pin Configuration for HX711
 GPIO.setmode(GPIO.BCM)
@@ -40,41 +50,68 @@ GPIO.setwarnings(False)
 hx = HX711(dout_pin=5, pd_sck_pin=6)  # HX711 data and clock pins
 
 # FSR Sensor Configuration
-adc = Adafruit_ADS1x15.ADS1015(address=0x48, busnum=1)  # I2C address and bus for ADC
-GAIN = 1  # ADC gain setting
+adc = ADS1x15.ADS1015(1, 0x48)  # I2C bus and address for ADC
+adc.setGain(adc.PGA_4_096V)  # +/-4.096V input range
+adc.setDataRate(adc.DR_ADS101X_3300)  # Fastest data rate (FSR signal bandwidth is well below 100 Hz)
+adc.setMode(adc.MODE_SINGLE)  # Single-shot conversions started with requestADC()
 FSR_CHANNELS = [0, 1, 3]  # ADC channels connected to FSR sensors
 FSR_NAMES = ["Bottom (A0)", "Top (A1)", "Right (A3)"]  # Descriptive names for FSR positions
 FSR_MIN = -1  # Minimum raw ADC value for FSR calibration
 FSR_MAX = 1873  # Maximum raw ADC value for FSR calibration
+FSR_SCALE = 100.0 / (FSR_MAX - FSR_MIN) if FSR_MAX > FSR_MIN else 0.0  # Percent per raw ADC count
 WARNING_THRESHOLD = 50.0  # FSR percentage threshold for accuracy classification
 
 # ==================== GLOBAL VARIABLES ====================
 
 # Impact Detection Variables
-force_history = []  # Circular buffer for storing recent force readings for peak detection
+previous_weight_kg = 0.0  # Previous load cell reading for peak detection
 last_kick_time = 0  # Timestamp of last detected kick for cooldown management
 
+# Load Cell Sampling Variables
+load_cell_offset = 0.0  # Cached HX711 offset (raw count at zero load)
+load_cell_scale_ratio = 1.0  # Cached HX711 scale ratio (raw counts per gram)
+hx711_samples = deque(maxlen=16)  # Ring buffer of raw samples filled by the sampler thread
+
 # ==================== HELPER FUNCTIONS ====================
 
-def fsr_percentage(raw, f_min, f_max):
+def fsr_percentage(raw):
     """
-    Convert raw ADC reading to percentage value (0-100%).
+    Convert raw ADC reading to percentage value (0-100%) using the
+    FSR_MIN/FSR_MAX calibration range.
+    Also accepts a NumPy array, converting every reading in one pass.
     
     Args:
-        raw (float): Raw ADC reading from FSR sensor
-        f_min (float): Minimum calibration value (no pressure)
-        f_max (float): Maximum calibration value (full pressure)
+        raw (float or np.ndarray): Raw ADC reading(s) from FSR sensor
     
     Returns:
-        float: Percentage value between 0-100%
+        float or np.ndarray: Percentage value(s) between 0-100%
     """
-    if f_max <= f_min:
-        return 0.0
     # Clamp raw value within calibration range
-    raw = max(f_min, min(f_max, raw))
-    # Convert to percentage
-    percent = (raw - f_min) / (f_max - f_min) * 100
-    return max(0.0, min(100.0, percent))
+    raw = np.clip(raw, FSR_MIN, FSR_MAX)
+    # Convert to percentage with the precomputed scale (no division per reading)
+    return (raw - FSR_MIN) * FSR_SCALE
+
+
+def max_fsr_percentage(raw_values):
+    """
+    Convert a set of raw FSR readings and return the highest percentage.
+    
+    Args:
+        raw_values (np.ndarray): Raw int16 ADC readings, one per FSR channel
+    
+    Returns:
+        float: Maximum percentage value between 0-100%
+    """
+    return float(np.max(fsr_percentage(raw_values)))
+
+
+# Prefer the compiled Cython max_fsr_percentage() when the extension has been built
+# (python3 setup.py build_ext --inplace); the NumPy version above is the fallback
+try:
+    from _fsr import configure_fsr, max_fsr_percentage
+    configure_fsr(FSR_MIN, FSR_MAX, FSR_SCALE)
+except ImportError:
+    pass
 
 
 def load_calibration():
@@ -84,13 +121,18 @@ def load_calibration():
     Returns:
         bool: True if calibration loaded successfully, False otherwise
     """
+    global load_cell_offset, load_cell_scale_ratio
+    
     try:
         if os.path.exists(CALIB_FILE):
-            with open(CALIB_FILE, "r") as f:
-                data = json.load(f)
+            with open(CALIB_FILE, "rb") as f:
+                data = orjson.loads(f.read())
                 # Apply calibration parameters to HX711
                 hx.set_scale_ratio(data["scale_ratio"])
                 hx.set_offset(data["offset"])
+                # Cache them for the per-sample weight conversion
+                load_cell_offset = float(data["offset"])
+                load_cell_scale_ratio = float(data["scale_ratio"])
             print("Load cell calibration loaded successfully.")
             return True
         return False
@@ -104,6 +146,8 @@ def calibrate_load_cell():
     Perform one-time calibration of the HX711 load cell.
     Guides user through offset and scale ratio calculation.
     """
+    global load_cell_offset, load_cell_scale_ratio
+    
     try:
         print("Starting load cell calibration...")
         print("Please remove all weight from the sensor and press Enter.")
@@ -122,14 +166,16 @@ def calibrate_load_cell():
         # Calculate and apply scale ratio
         ratio = reading / known_weight_grams
         hx.set_scale_ratio(ratio)
+        load_cell_offset = float(offset)
+        load_cell_scale_ratio = float(ratio)
         
         # Save calibration data to file
         calibration_data = {
             "offset": offset,
             "scale_ratio": ratio
         }
-        with open(CALIB_FILE, "w") as f:
-            json.dump(calibration_data, f)
+        with open(CALIB_FILE, "wb") as f:
+            f.write(orjson.dumps(calibration_data))
             
         print("Load cell calibration saved successfully!")
         
@@ -137,40 +183,72 @@ def calibrate_load_cell():
         print(f"Calibration error: {e}")
 
 
-def read_fsr_sensors():
+async def read_fsr_sensors():
     """
     Read all FSR sensors and return the maximum pressure percentage.
+    Conversions are started and polled without blocking, so the event loop
+    keeps running while the ADC is busy.
     
     Returns:
         float: Maximum pressure percentage from all FSR sensors (0-100%)
     """
     try:
-        percentages = []
-        for channel in FSR_CHANNELS:
-            # Read raw ADC value from each FSR channel
-            raw_value = adc.read_adc(channel, gain=GAIN)
-            # Convert to percentage
-            percent = fsr_percentage(raw_value, FSR_MIN, FSR_MAX)
-            percentages.append(percent)
+        raw_values = np.empty(len(FSR_CHANNELS), dtype=np.int16)
+        # Start the first conversion, then chain the rest as each one completes
+        adc.requestADC(FSR_CHANNELS[0])
+        for index in range(len(FSR_CHANNELS)):
+            # Yield to the event loop until the conversion is ready
+            while not adc.isReady():
+                await asyncio.sleep(0)
+            raw_values[index] = adc.getValue()
+            # Kick off the next channel's conversion straight away
+            if index + 1 < len(FSR_CHANNELS):
+                adc.requestADC(FSR_CHANNELS[index + 1])
         # Return the highest pressure detected (worst-case accuracy)
-        return max(percentages)
+        return max_fsr_percentage(raw_values)
     except Exception as e:
         print(f"FSR read error: {e}")
         return 0.0
 
 
+def _hx711_pump(loop, sample_event):
+    """
+    Background sampler thread for the HX711 load cell.
+    Reads raw counts as fast as the ADC delivers them (80 SPS) and pushes
+    them into the sample ring buffer, so the event loop never waits on DOUT.
+    
+    Args:
+        loop (asyncio.AbstractEventLoop): Event loop running main()
+        sample_event (asyncio.Event): Event set whenever a new sample is available
+    """
+    while True:
+        try:
+            raw = hx._read()
+            # _read() returns False when the HX711 did not deliver a valid sample
+            if raw is not False:
+                hx711_samples.append(raw)
+                loop.call_soon_threadsafe(sample_event.set)
+        except Exception as e:
+            print(f"Load cell sampler error: {e}")
+            time.sleep(1)
+
+
 def read_load_cell_fast():
     """
-    Read load cell with minimal delay for quick impact detection.
-    Uses fewer readings than standard method for faster response.
+    Take the next load cell sample captured by the background sampler.
+    Returns immediately instead of waiting for the HX711 to convert.
     
     Returns:
-        tuple: (weight_kg, force_newtons) - Weight in kg and force in Newtons
+        tuple: (weight_kg, force_newtons) - Weight in kg and force in Newtons,
+               or None if no new sample is available yet
     """
     try:
-        # Use minimal readings for fastest response (tradeoff: slightly more noise)
-        weight_grams = hx.get_weight_mean(readings=2)
-        weight_kg = weight_grams / 1000.0
+        raw = hx711_samples.popleft()
+    except IndexError:
+        return None
+    try:
+        # Apply the cached calibration to the raw count (same maths as get_weight_mean)
+        weight_kg = (raw - load_cell_offset) / load_cell_scale_ratio / 1000.0
         force_newtons = weight_kg * 9.81  # Convert kg to Newtons (F = m*g)
         return weight_kg, force_newtons
     except Exception as e:
@@ -178,6 +256,86 @@ def read_load_cell_fast():
         return 0.0, 0.0
 
 
+async def _send_kick_batch(session, batch):
+    """
+    Write a batch of kicks to Firebase with a single multi-key PATCH.
+    
+    Args:
+        session (aiohttp.ClientSession): Shared HTTP session
+        batch (dict): Kick payloads keyed by their database key
+    """
+    try:
+        async with session.patch(FIREBASE_URL, data=orjson.dumps(batch)) as response:
+            if response.status == 200:
+                print(f"{len(batch)} kick(s) sent to Firebase successfully!\n")
+            else:
+                print(f"Firebase error: {response.status}\n")
+    except Exception as e:
+        print(f"Firebase connection error: {e}\n")
+
+
+async def firebase_uploader(upload_queue):
+    """
+    Background uploader task for Firebase.
+    Groups queued kicks into batches (up to UPLOAD_BATCH_SIZE kicks or
+    UPLOAD_BATCH_WINDOW seconds) and writes each batch with a single
+    multi-key PATCH over one keep-alive aiohttp session.
+    When cancelled at shutdown, it sends every pending kick before exiting.
+    
+    Args:
+        upload_queue (asyncio.Queue): Queue of (key, payload) tuples to send
+    """
+    async with aiohttp.ClientSession(
+        headers={"Content-Type": "application/json"},  # Payloads are pre-serialized with orjson
+        timeout=aiohttp.ClientTimeout(total=10),
+    ) as session:
+        batch = {}
+        try:
+            while True:
+                # Wait for the first kick, then collect more until the batch is full or the window closes
+                key, payload = await upload_queue.get()
+                batch[key] = payload
+                deadline = time.monotonic() + UPLOAD_BATCH_WINDOW
+                while len(batch) < UPLOAD_BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        key, payload = await asyncio.wait_for(upload_queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    batch[key] = payload
+                
+                await _send_kick_batch(session, batch)
+                batch = {}
+        except asyncio.CancelledError:
+            # Shutting down: flush the pending batch (re-sending it if the PATCH was
+            # interrupted, which is safe as the keys are unchanged) plus anything still queued
+            while True:
+                try:
+                    key, payload = upload_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                batch[key] = payload
+            if batch:
+                print(f"Sending {len(batch)} pending kick(s) before exiting...")
+                await _send_kick_batch(session, batch)
+            raise
+
+
+def _report_uploader_exit(task):
+    """
+    Done callback for the uploader task.
+    Reports an unexpected failure, since kicks would otherwise pile up unsent without notice.
+    
+    Args:
+        task (asyncio.Task): The finished uploader task
+    """
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Firebase uploader stopped: {task.exception()!r}")
+        print("Kicks will no longer be uploaded. Restart the application.\n")
+
+
 def detect_impact(weight_kg):
     """
     Detect quick impacts using peak detection algorithm.
@@ -189,36 +347,56 @@ def detect_impact(weight_kg):
     Returns:
         bool: True if impact detected, False otherwise
     """
-    global force_history, last_kick_time
+    global previous_weight_kg, last_kick_time
     
-    current_time = time.time()
+    previous_kg = previous_weight_kg
+    previous_weight_kg = weight_kg
     
-    # Add current reading to circular buffer
-    force_history.append(weight_kg)
-    
-    # Maintain fixed-size history (last 3 readings)
-    if len(force_history) > 3:
-        force_history.pop(0)
-    
-    # Require minimum history for reliable detection
-    if len(force_history) < 2:
+    # Fast path: an idle pad cannot produce a kick, so skip the clock read
+    if weight_kg < FAST_GATE_KG:
         return False
     
+    current_time = time.time()
+    
     # Enforce cooldown period between detections
     if current_time - last_kick_time < KICK_COOLDOWN:
         return False
     
-    # Check if force exceeds minimum threshold
-    if weight_kg >= KICK_THRESHOLD_KG:
-        # Peak detection: current value must be higher than previous reading
-        # This ensures we capture the moment of impact, not sustained pressure
-        if weight_kg > force_history[-2]:
-            last_kick_time = current_time
-            return True
+    # Force must exceed minimum threshold and be higher than the previous reading
+    # (peak detection captures the moment of impact, not sustained pressure)
+    if weight_kg >= KICK_THRESHOLD_KG and weight_kg > previous_kg:
+        last_kick_time = current_time
+        return True
     
     return False
 
 
+def reset_impact_detection():
+    """
+    Discard buffered load cell samples and the peak detection history.
+    Used after (re)connecting, so readings taken while BLE was down are
+    never reported as a new kick.
+    """
+    global previous_weight_kg
+    
+    hx711_samples.clear()
+    previous_weight_kg = 0.0
+
+
+def kick_timestamps():
+    """
+    Build local and UTC ISO 8601 timestamps from a single clock read.
+    
+    Returns:
+        tuple: (local_time, utc_time) - Local time string and UTC time string with "+00:00" offset
+    """
+    seconds, microseconds = divmod(time.time_ns() // 1000, 1_000_000)
+    fraction = f".{microseconds:06d}"
+    local_time = time.strftime(TIMESTAMP_FORMAT, time.localtime(seconds)) + fraction
+    utc_time = time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds)) + fraction + "+00:00"
+    return local_time, utc_time
+
+
 def determine_accuracy(max_fsr_percent):
     """
     Classify kick accuracy based on FSR edge pressure.
@@ -265,18 +443,65 @@ async def main():
     if not load_calibration():
         calibrate_load_cell()
     
+    # Start sampling the load cell and uploading kicks in the background
+    sample_event = asyncio.Event()
+    threading.Thread(target=_hx711_pump, args=(asyncio.get_running_loop(), sample_event), daemon=True).start()
+    upload_queue = asyncio.Queue()
+    uploader_task = asyncio.create_task(firebase_uploader(upload_queue))  # Keep a reference so the task is not garbage collected
+    uploader_task.add_done_callback(_report_uploader_exit)
+    
+    # Most recent kick speed pushed by the Arduino, as (time.monotonic() when received, speed in m/s)
+    latest_speed = (0.0, 0.0)
+    speed_event = asyncio.Event()  # Set whenever a speed notification arrives
+    previous_kick_at = 0.0  # time.monotonic() of the previous detected kick
+    
+    def on_speed_notify(sender, data):
+        """
+        BLE notification handler for the speed characteristic.
+        Keeps the latest speed so the kick path never waits on a BLE read.
+        """
+        nonlocal latest_speed
+        try:
+            # Anything but the exact packet size (e.g. old JSON firmware) would decode as garbage
+            if len(data) != SPEED_PACKET.size:
+                raise ValueError(f"unexpected {len(data)}-byte packet (expected {SPEED_PACKET.size} bytes)")
+            speed, _ = SPEED_PACKET.unpack(data)
+        except Exception as e:
+            print(f"Error reading BLE data: {e}")
+            return
+        latest_speed = (time.monotonic(), speed)
+        speed_event.set()
+    
+    async def speed_for_kick(kick_at):
+        """
+        Get the speed the Arduino reports for a kick, waiting briefly for it.
+        The firmware only notifies once its kick window has ended, so the
+        notification may arrive shortly after the load cell detects the impact.
+        
+        Args:
+            kick_at (float): time.monotonic() when the kick was detected
+        
+        Returns:
+            float: Speed in m/s, or None if no notification newer than the
+                   previous kick arrived in time
+        """
+        since = max(previous_kick_at, kick_at - SPEED_MAX_LEAD)
+        notified_at, speed = latest_speed
+        if notified_at > since:
+            return speed
+        speed_event.clear()
+        try:
+            await asyncio.wait_for(speed_event.wait(), timeout=SPEED_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        return latest_speed[1]
+    
     # Main reconnection loop - automatically recovers from connection failures
     while True:
         try:
             print("Scanning for BLE devices...")
-            devices = await BleakScanner.discover()
-            target_device = None
-
-            # Search for KickMeter device by name
-            for device in devices:
-                if device.name and DEVICE_NAME in device.name:
-                    target_device = device
-                    break
+            # Stop scanning as soon as the KickMeter is advertised
+            target_device = await BleakScanner.find_device_by_name(DEVICE_NAME, timeout=5)
 
             if target_device is None:
                 print("KickMeter not found. Retrying in 5 seconds...")
@@ -288,6 +513,10 @@ async def main():
             # Establish BLE connection
             async with BleakClient(target_device.address) as client:
                 print("Connected to Arduino!")
+                # Subscribe to speed updates instead of reading on every kick
+                await client.start_notify(CHAR_UUID, on_speed_notify)
+                # Start detection from fresh samples only
+                reset_impact_detection()
                 print(f"System ready. Monitoring for quick kicks (threshold: {KICK_THRESHOLD_KG} kg)...\n")
 
                 # Main sensor monitoring loop
@@ -298,44 +527,55 @@ async def main():
                             print("Connection lost. Reconnecting...")
                             break
 
-                        # Read load cell with fast sampling
-                        weight_kg, force_newtons = read_load_cell_fast()
+                        # Take the next load cell sample
+                        reading = read_load_cell_fast()
+                        if reading is None:
+                            # Nothing pending: wait for the sampler thread to signal a new sample
+                            # (with a timeout so the connection check above still runs)
+                            sample_event.clear()
+                            try:
+                                await asyncio.wait_for(sample_event.wait(), timeout=1.0)
+                            except asyncio.TimeoutError:
+                                pass
+                            continue
+                        weight_kg, force_newtons = reading
                         
                         # Check for impact using peak detection
                         if detect_impact(weight_kg):
+                            kick_at = time.monotonic()
+                            
+                            # Start reading FSR sensors for accuracy assessment straight away,
+                            # so the ADC converts while the rest of the kick is processed
+                            fsr_task = asyncio.create_task(read_fsr_sensors())
+                            await asyncio.sleep(0)  # Let the task request its first conversion
+                            
                             # Capture all sensor data at moment of impact
                             kick_weight = weight_kg
                             kick_force = force_newtons
                             
+                            # Generate timestamps
+                            local_time, utc_time = kick_timestamps()
+                            
+                            kick_type = determine_kick_type(kick_weight)
                             print(f"Kick detected! (Weight: {kick_weight:.2f} kg)")
                             
-                            # Read speed data from BLE device
-                            try:
-                                value = await client.read_gatt_char(CHAR_UUID)
-                                data_str = value.decode("utf-8").strip()
-                                sensor_data = json.loads(data_str)
-                                speed = float(sensor_data.get("speed", 0))
-                            except Exception as e:
-                                print(f"Error reading BLE data: {e}")
-                                speed = 0.0
-
-                            # Read FSR sensors for accuracy assessment
-                            max_fsr_percent = read_fsr_sensors()
+                            # Speed notified over BLE for this kick (None if it never arrived)
+                            speed = await speed_for_kick(kick_at)
+                            previous_kick_at = kick_at
                             
-                            # Analyze kick characteristics
+                            # Collect the FSR result and analyze accuracy
+                            max_fsr_percent = await fsr_task
                             accuracy = determine_accuracy(max_fsr_percent)
-                            kick_type = determine_kick_type(kick_weight)
-
-                            # Generate timestamps
-                            local_time = datetime.now().isoformat()
-                            utc_time = datetime.now(timezone.utc).isoformat()
 
                             # Display kick analysis to console
                             print(f"  Kick Type: {kick_type}")
                             print(f"  Force: {kick_force:.2f} N")
                             print(f"  Edge Pressure: {max_fsr_percent:.1f}%")
                             print(f"  Accuracy: {accuracy}")
-                            print(f"  Speed: {speed:.2f} m/s")
+                            if speed is not None:
+                                print(f"  Speed: {speed:.2f} m/s")
+                            else:
+                                print("  Speed: not received")
                             print(f"  Time: {local_time}\n")
                             
                             # Prepare data payload for Firebase
@@ -349,18 +589,9 @@ async def main():
                                 "kick_detection_state": "kick_detected"
                             }
                             
-                            # Transmit data to Firebase
-                            try:
-                                response = requests.post(FIREBASE_URL, json=payload, timeout=10)
-                                if response.status_code == 200:
-                                    print("Data sent to Firebase successfully!\n")
-                                else:
-                                    print(f"Firebase error: {response.status_code}\n")
-                            except Exception as e:
-                                print(f"Firebase connection error: {e}\n")
-
-                        # Brief sleep to balance responsiveness and CPU usage
-                        await asyncio.sleep(0.05)
+                            # Hand the payload to the background uploader under a unique,
+                            # chronologically sortable key
+                            upload_queue.put_nowait((f"kick_{time.time_ns()}", payload))
 
                     except Exception as e:
                         print(f"Monitoring loop error: {e}")
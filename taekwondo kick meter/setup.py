@@ -0,0 +1,12 @@
+"""
+Build script for the compiled FSR kernel used by pi.py.
+Usage: python3 setup.py build_ext --inplace
+"""
+
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="kickmeter-fsr",
+    ext_modules=cythonize("_fsr.pyx"),
+)